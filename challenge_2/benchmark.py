@@ -0,0 +1,213 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import psutil
+import yaml
+import main
+from data_generator import DATA_GENERATOR, ELT_METADATA
+from local_warehouse import LOCAL_SESSION
+
+#MDM_BUILDER steps in the order run by mdm_process_start, with the variables naming the cleaned tables each one reads
+MDM_STAGES = {
+    "event_table_process": ["source_event_table_name", "source_deposit_table_name", "source_withdrawal_table_name"],
+    "login_type_table_process": ["source_event_table_name"],
+    "currency_process": ["source_deposit_table_name", "source_withdrawal_table_name"],
+    "interface_process": ["source_withdrawal_table_name"],
+    "tx_status_process": ["source_deposit_table_name", "source_withdrawal_table_name"],
+    "users_process": ["source_users_table_name"],
+    "user_activities_process": ["source_event_table_name", "source_deposit_table_name", "source_withdrawal_table_name"],
+}
+
+
+class RSS_SAMPLER:
+    def __init__(self, interval=0.01):
+        """
+        Initialize the RSS_SAMPLER, which tracks the peak resident memory of the process.
+
+        RSS includes native allocations made by DuckDB, Arrow and numpy, which tracemalloc does not see.
+
+        Parameters:
+        - interval (float): Seconds between samples.
+        """
+        self.interval = interval
+        self.process = psutil.Process()
+        self.start_rss = 0
+        self.peak_rss = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        """
+        Record the process RSS until the sampler is stopped.
+        """
+        while not self.stop_event.is_set():
+            self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+            self.stop_event.wait(self.interval)
+
+    def __enter__(self):
+        self.start_rss = self.process.memory_info().rss
+        self.peak_rss = self.start_rss
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop_event.set()
+        self.thread.join()
+        self.peak_rss = max(self.peak_rss, self.process.memory_info().rss)
+
+
+class PIPELINE_BENCHMARK:
+    def __init__(self, scales, work_path, config_file, env_variables_files, sample_interval=0.01, keep_files=False):
+        """
+        Initialize the PIPELINE_BENCHMARK.
+
+        Parameters:
+        - scales (list): Number of generated activity rows for every run.
+        - work_path (str): Directory for the generated files, local warehouse and exports.
+        - config_file (str): Path to the configuration file.
+        - env_variables_files (str): Path to the environment variables file.
+        - sample_interval (float): Seconds between process RSS samples.
+        - keep_files (bool): Keep the files of every run.
+        """
+        self.scales = scales
+        self.work_path = os.path.expanduser(work_path)
+        self.config_file = config_file
+        self.env_variables_files = env_variables_files
+        self.sample_interval = sample_interval
+        self.keep_files = keep_files
+
+    def measure(self, stage, rows, function, *args):
+        """
+        Run a stage measuring its time and process RSS.
+
+        The process rarely gives memory back between stages, so peak_rss_mb keeps climbing; the
+        memory of a stage is rss_growth_mb, its peak minus the RSS when it started.
+
+        Parameters:
+        - stage (str): Name of the stage.
+        - rows (int): Number of rows processed by the stage, None when not known before it runs.
+        - function (function): Stage to run.
+
+        Returns:
+        - result (dict): rows, seconds, peak_rss_mb and rss_growth_mb of the stage.
+        """
+        with RSS_SAMPLER(self.sample_interval) as sampler:
+            start = time.perf_counter()
+            function(*args)
+            seconds = time.perf_counter() - start
+        return {"stage": stage, "rows": rows, "seconds": seconds, "peak_rss_mb": sampler.peak_rss / 1024 ** 2, "rss_growth_mb": (sampler.peak_rss - sampler.start_rss) / 1024 ** 2}
+
+    @staticmethod
+    def table_rows(session, variables, table_keys):
+        """
+        Count the rows of cleaned staging tables.
+
+        Parameters:
+        - session (LOCAL_SESSION): Local warehouse session.
+        - variables (dict): variables section of variables.yaml.
+        - table_keys (list): Variables naming the tables.
+
+        Returns:
+        - int: Total number of rows.
+        """
+        schema = f"{variables['staging_database_name']}.{variables['cleaning_schema_name']}"
+        return sum(session.connection.execute(f"SELECT COUNT(*) FROM {schema}.{variables[key]}").fetchone()[0] for key in table_keys)
+
+    def variables_file(self, scale_path):
+        """
+        Write a copy of the variables file exporting into the run directory.
+
+        Parameters:
+        - scale_path (str): Directory of the run.
+
+        Returns:
+        - path (str): Path of the variables file.
+        """
+        with open(self.env_variables_files, "r") as config:
+            variables = yaml.safe_load(config)
+        variables["variables"]["target_path"] = os.path.join(scale_path, "target_files")
+        variables["variables"]["bitmap_index_file"] = os.path.join(scale_path, "target_files", "USER_BITMAP_INDEX.pkl")
+        path = os.path.join(scale_path, "variables.yaml")
+        with open(path, "w") as config:
+            yaml.safe_dump(variables, config)
+        return path
+
+    def run_scale(self, rows):
+        """
+        Generate data and run the ELT and MDM pipelines against a local warehouse.
+
+        Parameters:
+        - rows (int): Number of generated activity rows.
+
+        Returns:
+        - results (list): Measures of every stage.
+        """
+        scale_path = os.path.join(self.work_path, str(rows))
+        source_path = os.path.join(scale_path, "source_files") + os.sep
+        generator = DATA_GENERATOR(source_path, rows)
+        results = [self.measure("generate", None, generator.generate)]
+        source_rows = sum(generator.file_rows.values())
+        results[0]["rows"] = source_rows
+
+        env_variables_files = self.variables_file(scale_path)
+        with open(env_variables_files, "r") as config:
+            variables = yaml.safe_load(config)
+        session = LOCAL_SESSION(os.path.join(scale_path, "warehouse"))
+        session.bootstrap(variables["variables"], ELT_METADATA)
+        session_manager = main.SESSION_MANAGER(self.config_file, env_variables_files, session_builder=session.builder)
+
+        try:
+            elt = main.ELT(sorted(os.listdir(source_path)), self.config_file, env_variables_files, source_path, session_manager)
+            results.append(self.measure("start_etl_process", source_rows, elt.start_etl_process))
+            mdm = main.MDM_BUILDER(self.config_file, env_variables_files, session_manager)
+            for stage, table_keys in MDM_STAGES.items():
+                results.append(self.measure(stage, self.table_rows(session, variables["variables"], table_keys), getattr(mdm, stage)))
+        finally:
+            session_manager.close()
+            if not self.keep_files:
+                shutil.rmtree(scale_path, ignore_errors=True)
+        return results
+
+    @staticmethod
+    def report(rows, results):
+        """
+        Print the measures of a run.
+
+        rows is the number of rows each stage reads: every source file row for generate and
+        start_etl_process, the cleaned staging tables it reads for the MDM stages.
+
+        Parameters:
+        - rows (int): Number of generated activity rows.
+        - results (list): Measures of every stage.
+        """
+        print(f"\nScale: {rows:,} rows")
+        print(f"{'stage':<28}{'rows':>14}{'seconds':>10}{'rows/s':>14}{'peak RSS MB':>14}{'stage RSS MB':>14}")
+        for result in results:
+            rows_per_second = f"{result['rows'] / result['seconds']:,.0f}" if result["seconds"] else "-"
+            print(f"{result['stage']:<28}{result['rows']:>14,}{result['seconds']:>10.2f}{rows_per_second:>14}{result['peak_rss_mb']:>14,.1f}{result['rss_growth_mb']:>14,.1f}")
+
+    def run(self):
+        """
+        Run every scale.
+
+        Returns:
+        - results (dict): Relation scale, measures of every stage.
+        """
+        results = {}
+        for rows in self.scales:
+            results[rows] = self.run_scale(rows)
+            self.report(rows, results[rows])
+        return results
+
+
+if __name__ == "__main__":
+    config_file = 'config.yaml'
+    env_variables_files = 'variables.yaml'
+    scales = [1000000, 10000000, 100000000]
+    work_path = tempfile.mkdtemp(prefix="pipeline_benchmark_")
+    benchmark = PIPELINE_BENCHMARK(scales, work_path, config_file, env_variables_files)
+    benchmark.run()
@@ -0,0 +1,199 @@
+import os
+import numpy as np
+import pandas as pd
+
+#source files and the ELT_CONFIG metadata describing them
+USERS_FILE = "user_id_sample_data.csv"
+EVENT_FILE = "event_sample_data.csv"
+DEPOSIT_FILE = "deposit_sample_data.csv"
+WITHDRAWAL_FILE = "withdrawals_sample_data.csv"
+
+ELT_METADATA = [
+    {"FILE_NAME": USERS_FILE, "ID_COLUMN_NAME": "user_id", "STAGING_TABLE_NAME": "USERS_RAW", "TABLE_NAME": "USERS", "CONDITIONS": "dedup", "FILTER_COLUMNS": "", "RENAME_COLUMNS": "{}", "EVENT_NAME": "", "UNIQUE_COLUMNS_LIST": "[]"},
+    {"FILE_NAME": EVENT_FILE, "ID_COLUMN_NAME": "id", "STAGING_TABLE_NAME": "EVENT_RAW", "TABLE_NAME": "EVENT", "CONDITIONS": "dedup,login_filter,column_rename,event_name", "FILTER_COLUMNS": "", "RENAME_COLUMNS": "{'event_name': 'login_type'}", "EVENT_NAME": "login", "UNIQUE_COLUMNS_LIST": "[]"},
+    {"FILE_NAME": DEPOSIT_FILE, "ID_COLUMN_NAME": "id", "STAGING_TABLE_NAME": "DEPOSIT_RAW", "TABLE_NAME": "DEPOSIT", "CONDITIONS": "dedup,fill_na,drop_negatives,event_name", "FILTER_COLUMNS": "amount", "RENAME_COLUMNS": "{}", "EVENT_NAME": "deposit", "UNIQUE_COLUMNS_LIST": "[]"},
+    {"FILE_NAME": WITHDRAWAL_FILE, "ID_COLUMN_NAME": "id", "STAGING_TABLE_NAME": "WITHDRAWAL_RAW", "TABLE_NAME": "WITHDRAWAL", "CONDITIONS": "dedup,fill_na,drop_negatives,event_name", "FILTER_COLUMNS": "amount", "RENAME_COLUMNS": "{}", "EVENT_NAME": "withdrawal", "UNIQUE_COLUMNS_LIST": "[]"},
+]
+
+
+class DATA_GENERATOR:
+    def __init__(self, output_path, rows, users=None, chunk_size=1000000, seed=0):
+        """
+        Initialize the DATA_GENERATOR.
+
+        Parameters:
+        - output_path (str): Directory where the source CSV files are written.
+        - rows (int): Total number of unique event, deposit and withdrawal rows.
+        - users (int): Number of users, defaults to rows / 20.
+        - chunk_size (int): Rows generated and written at a time.
+        - seed (int): Random seed.
+        """
+        self.output_path = os.path.expanduser(output_path)
+        self.rows = rows
+        self.users = users or max(rows // 20, 1)
+        self.chunk_size = chunk_size
+        self.rng = np.random.default_rng(seed)
+        self.file_rows = {}
+
+        self.event_names = np.array(['login', '2falogin', 'login_api', 'level_1', 'level_2', 'level_3'])
+        self.currencies = np.array(['mxn', 'btc', 'usd', 'eth', 'xrp', 'ltc'])
+        self.tx_statuses = np.array(['complete', 'failed'])
+        self.interfaces = np.array(['app', 'web', 'api'])
+        self.start_timestamp = np.datetime64('2020-01-01T00:00:00')
+        self.timestamp_range = int((np.datetime64('2023-12-31T23:59:59') - self.start_timestamp) / np.timedelta64(1, 's'))
+        self.duplicate_rate = 0.01
+        self.null_rate = 0.02
+        self.negative_rate = 0.01
+
+        self.user_ids = np.array([bytes(row).hex() for row in self.rng.integers(0, 256, size=(self.users, 16), dtype=np.uint8)])
+
+    def write_chunks(self, file_name, rows, chunk_builder):
+        """
+        Write a source file chunk by chunk, adding duplicates of a share of every chunk on top.
+        The rows written, duplicates included, are recorded in file_rows.
+
+        Parameters:
+        - file_name (str): Name of the output file.
+        - rows (int): Number of unique rows to write.
+        - chunk_builder (function): Builds a DataFrame for a given first id and size.
+
+        Returns:
+        - path (str): Path of the written file.
+        """
+        path = os.path.join(self.output_path, file_name)
+        written = 0
+        header = True
+        while written < rows:
+            size = min(self.chunk_size, rows - written)
+            df = chunk_builder(written, size)
+            duplicates = df.sample(n=int(size * self.duplicate_rate), replace=True, random_state=self.rng)
+            df = pd.concat([df, duplicates], ignore_index=True)
+            df.to_csv(path, mode='w' if header else 'a', header=header, index=False)
+            header = False
+            written += size
+            self.file_rows[file_name] = self.file_rows.get(file_name, 0) + len(df)
+        return path
+
+    def base_chunk(self, first_id, size):
+        """
+        Build the id, event_timestamp and user_id columns shared by every activity file.
+
+        Parameters:
+        - first_id (int): First id of the chunk.
+        - size (int): Number of rows.
+
+        Returns:
+        - df (DataFrame): Base chunk.
+        """
+        seconds = self.rng.integers(0, self.timestamp_range, size=size)
+        return pd.DataFrame({
+            "id": np.arange(first_id, first_id + size),
+            "event_timestamp": self.start_timestamp + seconds.astype('timedelta64[s]'),
+            "user_id": self.user_ids[self.rng.integers(0, self.users, size=size)],
+        })
+
+    def amounts(self, size):
+        """
+        Build an amount column with nulls and negative values.
+
+        Parameters:
+        - size (int): Number of rows.
+
+        Returns:
+        - amounts (ndarray): Amounts.
+        """
+        amounts = np.round(self.rng.lognormal(mean=6, sigma=1.5, size=size), 2)
+        amounts[self.rng.random(size) < self.negative_rate] *= -1
+        amounts[self.rng.random(size) < self.null_rate] = np.nan
+        return amounts
+
+    def event_chunk(self, first_id, size):
+        """
+        Build an event chunk with login and non login event names.
+
+        Parameters:
+        - first_id (int): First id of the chunk.
+        - size (int): Number of rows.
+
+        Returns:
+        - df (DataFrame): Event chunk.
+        """
+        df = self.base_chunk(first_id, size)
+        df["event_name"] = self.rng.choice(self.event_names, size=size)
+        return df
+
+    def deposit_chunk(self, first_id, size):
+        """
+        Build a deposit chunk.
+
+        Parameters:
+        - first_id (int): First id of the chunk.
+        - size (int): Number of rows.
+
+        Returns:
+        - df (DataFrame): Deposit chunk.
+        """
+        df = self.base_chunk(first_id, size)
+        df["amount"] = self.amounts(size)
+        df["currency"] = self.rng.choice(self.currencies, size=size)
+        df["tx_status"] = self.rng.choice(self.tx_statuses, size=size, p=[0.9, 0.1])
+        return df
+
+    def withdrawal_chunk(self, first_id, size):
+        """
+        Build a withdrawal chunk.
+
+        Parameters:
+        - first_id (int): First id of the chunk.
+        - size (int): Number of rows.
+
+        Returns:
+        - df (DataFrame): Withdrawal chunk.
+        """
+        df = self.base_chunk(first_id, size)
+        df["amount"] = self.amounts(size)
+        df["interface"] = self.rng.choice(self.interfaces, size=size)
+        df["currency"] = self.rng.choice(self.currencies, size=size)
+        df["tx_status"] = self.rng.choice(self.tx_statuses, size=size, p=[0.9, 0.1])
+        return df
+
+    def users_chunk(self, first_id, size):
+        """
+        Build a users chunk.
+
+        Parameters:
+        - first_id (int): First id of the chunk.
+        - size (int): Number of rows.
+
+        Returns:
+        - df (DataFrame): Users chunk.
+        """
+        return pd.DataFrame({"user_id": self.user_ids[first_id:first_id + size]})
+
+    def generate(self):
+        """
+        Generate the users, event, deposit and withdrawal source files.
+
+        Activity rows are split 70% events, 20% deposits and 10% withdrawals, and every file gets
+        duplicate_rate duplicated rows on top. The users file holds every user id, so every activity
+        user exists in USERS_DIM.
+
+        Returns:
+        - files (list): Names of the generated files.
+        """
+        os.makedirs(self.output_path, exist_ok=True)
+        event_rows = int(self.rows * 0.7)
+        deposit_rows = int(self.rows * 0.2)
+        withdrawal_rows = self.rows - event_rows - deposit_rows
+        self.write_chunks(USERS_FILE, self.users, self.users_chunk)
+        self.write_chunks(EVENT_FILE, event_rows, self.event_chunk)
+        self.write_chunks(DEPOSIT_FILE, deposit_rows, self.deposit_chunk)
+        self.write_chunks(WITHDRAWAL_FILE, withdrawal_rows, self.withdrawal_chunk)
+        return [USERS_FILE, EVENT_FILE, DEPOSIT_FILE, WITHDRAWAL_FILE]
+
+
+if __name__ == "__main__":
+    output_path = '~/bitso_tech_challenge/challenge_2/source_files/'
+    rows = 1000000
+    generator = DATA_GENERATOR(output_path, rows)
+    print(generator.generate())
@@ -0,0 +1,224 @@
+import os
+import re
+import duckdb
+
+#local warehouse stand-in used by the benchmark suite
+class LOCAL_DATAFRAME:
+    def __init__(self, session, query):
+        """
+        Initialize the LOCAL_DATAFRAME, a lazily executed query like a Snowpark DataFrame.
+
+        Parameters:
+        - session (LOCAL_SESSION): Session running the query.
+        - query (str): SQL query.
+        """
+        self.session = session
+        self.query = query
+
+    def collect(self):
+        """
+        Run the query.
+
+        Returns:
+        - rows (list): Result rows as dictionaries.
+        """
+        cursor = self.session.connection.execute(self.session.translate(self.query))
+        if cursor.description is None:
+            return []
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def to_pandas(self):
+        """
+        Run the query.
+
+        Returns:
+        - df (DataFrame): Query result.
+        """
+        return self.session.connection.execute(self.session.translate(self.query)).df()
+
+    def to_pandas_batches(self, rows_per_batch=1000000):
+        """
+        Run the query and yield the result in batches.
+
+        Parameters:
+        - rows_per_batch (int): Rows per batch.
+
+        Returns:
+        - generator: DataFrame batches.
+        """
+        reader = self.session.connection.execute(self.session.translate(self.query)).fetch_record_batch(rows_per_batch)
+        for batch in reader:
+            yield batch.to_pandas()
+
+
+class LOCAL_SESSION:
+    def __init__(self, warehouse_path):
+        """
+        Initialize the LOCAL_SESSION, a DuckDB backed stand-in for a Snowpark Session.
+
+        Every Snowflake database is a DuckDB file attached under the same name, so the
+        DATABASE.SCHEMA.TABLE names used by the pipelines resolve unchanged.
+
+        Parameters:
+        - warehouse_path (str): Directory holding the DuckDB database files.
+        """
+        self.warehouse_path = os.path.expanduser(warehouse_path)
+        os.makedirs(self.warehouse_path, exist_ok=True)
+        self.connection = duckdb.connect()
+
+    @property
+    def builder(self):
+        """
+        Builder returning this session, used in place of Session.builder.
+        """
+        return LOCAL_SESSION_BUILDER(self)
+
+    @staticmethod
+    def translate(query):
+        """
+        Translate the Snowflake only parts of a query.
+
+        DATABASE.INFORMATION_SCHEMA.TABLES becomes a view over duckdb_tables(). DuckDB does not
+        track LAST_ALTERED, so it is NULL and table versions are reported as unknown.
+
+        Parameters:
+        - query (str): SQL query.
+
+        Returns:
+        - str: DuckDB query.
+        """
+        return re.sub(r"(\w+)\.INFORMATION_SCHEMA\.TABLES",
+            r"(SELECT database_name AS TABLE_CATALOG, schema_name AS TABLE_SCHEMA, table_name AS TABLE_NAME, estimated_size AS ROW_COUNT, NULL AS LAST_ALTERED FROM duckdb_tables() WHERE database_name = '\1')",
+            query, flags=re.IGNORECASE)
+
+    def sql(self, query):
+        """
+        Create a lazily executed query.
+
+        Parameters:
+        - query (str): SQL query.
+
+        Returns:
+        - LOCAL_DATAFRAME: Query to collect.
+        """
+        return LOCAL_DATAFRAME(self, query)
+
+    def table(self, table_name):
+        """
+        Create a lazily executed query over a whole table.
+
+        Parameters:
+        - table_name (str): Fully qualified name of the table.
+
+        Returns:
+        - LOCAL_DATAFRAME: Query to collect.
+        """
+        return LOCAL_DATAFRAME(self, f"SELECT * FROM {table_name}")
+
+    def table_exists(self, database, schema, table_name):
+        """
+        Check if a table exists.
+
+        Parameters:
+        - database (str): Name of the database.
+        - schema (str): Name of the schema.
+        - table_name (str): Name of the table.
+
+        Returns:
+        - bool: True if the table exists.
+        """
+        rows = self.connection.execute("SELECT 1 FROM duckdb_tables() WHERE lower(database_name) = lower(?) AND lower(schema_name) = lower(?) AND lower(table_name) = lower(?)", [database, schema, table_name]).fetchall()
+        return bool(rows)
+
+    def write_pandas(self, df, table_name, database=None, schema=None, auto_create_table=False, overwrite=False, table_type="", **kwargs):
+        """
+        Write a DataFrame to a table.
+
+        Tables are (re)created from the DataFrame when overwrite is set or they do not exist.
+        Appended DataFrames fill the trailing table columns in order, so dimension tables keep
+        generating their ID column.
+
+        Parameters:
+        - df (DataFrame): DataFrame to write.
+        - table_name (str): Name of the table.
+        - database (str): Name of the database.
+        - schema (str): Name of the schema.
+        - auto_create_table (bool): Accepted for Snowpark compatibility.
+        - overwrite (bool): Replace the table.
+        - table_type (str): Accepted for Snowpark compatibility, temporary tables are dropped by the caller.
+        """
+        target = f"{database}.{schema}.{table_name}"
+        self.connection.register("write_pandas_df", df)
+        try:
+            if overwrite or not self.table_exists(database, schema, table_name):
+                self.connection.execute(f"CREATE OR REPLACE TABLE {target} AS SELECT * FROM write_pandas_df")
+            else:
+                table_columns = [row[0] for row in self.connection.execute(f"DESCRIBE {target}").fetchall()]
+                columns = ", ".join(table_columns[-len(df.columns):])
+                self.connection.execute(f"INSERT INTO {target} ({columns}) SELECT * FROM write_pandas_df")
+        finally:
+            self.connection.unregister("write_pandas_df")
+
+    def bootstrap(self, variables, elt_metadata):
+        """
+        Create the databases, schemas, config, log and dimension tables the pipelines expect.
+
+        Parameters:
+        - variables (dict): variables section of variables.yaml.
+        - elt_metadata (list): ELT_CONFIG metadata rows, one dictionary per source file.
+        """
+        databases = {
+            variables["staging_database_name"]: [variables["staging_schema_name"], variables["cleaning_schema_name"]],
+            variables["config_database"]: [variables["config_schema"]],
+            variables["mdm_database_name"]: [variables["mdm_schema_name"]],
+            variables["log_database_name"]: [variables["log_schema_name"]],
+        }
+        for database, schemas in databases.items():
+            self.connection.execute(f"ATTACH IF NOT EXISTS '{os.path.join(self.warehouse_path, database)}.duckdb' AS {database}")
+            for schema in schemas:
+                self.connection.execute(f"CREATE SCHEMA IF NOT EXISTS {database}.{schema}")
+
+        log_table = f"{variables['log_database_name']}.{variables['log_schema_name']}.{variables['log_table_name']}"
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS {log_table} (STEP VARCHAR, STATUS VARCHAR, MESSAGE VARCHAR, LOG_TIMESTAMP TIMESTAMP DEFAULT current_timestamp)")
+
+        metadata_table = f"{variables['config_database']}.{variables['config_schema']}.{variables['elt_metadata']}"
+        self.connection.execute(f"CREATE OR REPLACE TABLE {metadata_table} (FILE_NAME VARCHAR, ID_COLUMN_NAME VARCHAR, STAGING_TABLE_NAME VARCHAR, TABLE_NAME VARCHAR, CONDITIONS VARCHAR, FILTER_COLUMNS VARCHAR, RENAME_COLUMNS VARCHAR, EVENT_NAME VARCHAR, UNIQUE_COLUMNS_LIST VARCHAR)")
+        for row in elt_metadata:
+            self.connection.execute(f"INSERT INTO {metadata_table} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", [row["FILE_NAME"], row["ID_COLUMN_NAME"], row["STAGING_TABLE_NAME"], row["TABLE_NAME"], row["CONDITIONS"], row["FILTER_COLUMNS"], row["RENAME_COLUMNS"], row["EVENT_NAME"], row["UNIQUE_COLUMNS_LIST"]])
+
+        dimensions = {
+            variables["event_name_table_name"]: "EVENT_NAME",
+            variables["login_type_table_name"]: "LOGIN_TYPE_NAME",
+            variables["currency_table_name"]: "CURRENCY_NAME",
+            variables["interface_table_name"]: "INTERFACE_NAME",
+            variables["tx_table_name"]: "TX_STATUS_NAME",
+            variables["target_users_table_name"]: "USER_ID",
+        }
+        mdm = f"{variables['mdm_database_name']}.{variables['mdm_schema_name']}"
+        for table_name, column in dimensions.items():
+            self.connection.execute(f"CREATE SEQUENCE IF NOT EXISTS {mdm}.{table_name}_SEQ")
+            self.connection.execute(f"CREATE TABLE IF NOT EXISTS {mdm}.{table_name} (ID INTEGER DEFAULT nextval('{mdm}.{table_name}_SEQ'), {column} VARCHAR)")
+
+    def close(self):
+        """
+        Close the DuckDB connection.
+        """
+        self.connection.close()
+
+
+class LOCAL_SESSION_BUILDER:
+    def __init__(self, session):
+        """
+        Initialize the LOCAL_SESSION_BUILDER, which ignores the connection parameters and returns the given session.
+
+        Parameters:
+        - session (LOCAL_SESSION): Session to return.
+        """
+        self.session = session
+
+    def configs(self, connection_params):
+        return self
+
+    def create(self):
+        return self.session
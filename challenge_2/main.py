@@ -1,31 +1,107 @@
 import os
+import glob
+import shutil
+import gzip
+import bz2
 import yaml
 import ast
-import pandas as pd
-import numpy as np
-from snowflake.snowpark.session import Session
+import pickle
+import importlib
 
-#function definition
-class ELT:
 
-    def __init__(self, files_name, config_file, env_variables_files, source_path):
+class LAZY_MODULE:
+    def __init__(self, module_name):
         """
-        Initialize the ETLProcessor.
+        Initialize the LAZY_MODULE, a module imported on first attribute access.
+
+        Parameters:
+        - module_name (str): Name of the module.
+        """
+        self.module_name = module_name
+        self.module = None
+
+    def __getattr__(self, name):
+        if self.module is None:
+            self.module = importlib.import_module(self.module_name)
+        return getattr(self.module, name)
+
+
+pd = LAZY_MODULE("pandas")
+np = LAZY_MODULE("numpy")
+
+
+#session manager
+class SESSION_MANAGER:
+    managers = {}
+
+    def __init__(self, config_file, env_variables_files, session_builder=None):
+        """
+        Initialize the SESSION_MANAGER.
+
+        The yaml files are read once and the Snowflake session is only created when first used,
+        then shared by every pipeline using this manager.
 
         Parameters:
-        - files_name (list): List of file names to process.
         - config_file (str): Path to the configuration file.
         - env_variables_files (str): Path to the environment variables file.
-        - source_path (str): Path to the source directory containing input files.
+        - session_builder (object): Session builder, defaults to the Snowpark Session.builder.
         """
-        self.file_name = files_name
         self.config_file = config_file
         self.env_variables_files = env_variables_files
-        self.source_path = source_path
+        self.session_builder = session_builder
+        self.credentials_values = None
+        self.variables_values = None
+        self.shared_session = None
 
-        with open(config_file, "r") as config:
-            credentials = yaml.safe_load(config)
+    @classmethod
+    def get(cls, config_file, env_variables_files):
+        """
+        Get the shared manager of a configuration.
 
+        Parameters:
+        - config_file (str): Path to the configuration file.
+        - env_variables_files (str): Path to the environment variables file.
+
+        Returns:
+        - SESSION_MANAGER: Shared manager.
+        """
+        key = (os.path.abspath(config_file), os.path.abspath(env_variables_files))
+        if key not in cls.managers:
+            cls.managers[key] = cls(config_file, env_variables_files)
+        return cls.managers[key]
+
+    @property
+    def credentials(self):
+        """
+        Configuration file content, read on first use.
+        """
+        if self.credentials_values is None:
+            with open(self.config_file, "r") as config:
+                self.credentials_values = yaml.safe_load(config)
+        return self.credentials_values
+
+    @property
+    def variables(self):
+        """
+        Environment variables file content, read on first use.
+        """
+        if self.variables_values is None:
+            with open(self.env_variables_files, "r") as config:
+                self.variables_values = yaml.safe_load(config)
+        return self.variables_values
+
+    def create_session(self):
+        """
+        Open a new Snowflake session.
+
+        Returns:
+        - session (Session): New session.
+        """
+        builder = self.session_builder
+        if builder is None:
+            from snowflake.snowpark.session import Session
+            builder = Session.builder
+        credentials = self.credentials
         connection_params = {
             "account":credentials["snowflake"]["account"],
             "user": credentials["snowflake"]["user"],
@@ -35,11 +111,50 @@ class ELT:
             "database":credentials["snowflake"]["database"],
             "schema": credentials["snowflake"]["schema"]
         }
+        return builder.configs(connection_params).create()
 
-        self.session = Session.builder.configs(connection_params).create()
+    @property
+    def session(self):
+        """
+        Session shared by the pipelines, opened on first use.
+        """
+        if self.shared_session is None:
+            self.shared_session = self.create_session()
+        return self.shared_session
 
-        with open(env_variables_files, "r") as config:
-            variables = yaml.safe_load(config)
+    def close(self):
+        """
+        Close the shared session and unregister the manager, so SESSION_MANAGER.get creates a new one.
+        """
+        if self.shared_session is not None:
+            self.shared_session.close()
+            self.shared_session = None
+        for key, manager in list(SESSION_MANAGER.managers.items()):
+            if manager is self:
+                del SESSION_MANAGER.managers[key]
+
+
+#function definition
+class ELT:
+
+    def __init__(self, files_name, config_file, env_variables_files, source_path, session_manager=None):
+        """
+        Initialize the ETLProcessor.
+
+        Parameters:
+        - files_name (list): List of file names to process.
+        - config_file (str): Path to the configuration file.
+        - env_variables_files (str): Path to the environment variables file.
+        - source_path (str): Path to the source directory containing input files.
+        - session_manager (SESSION_MANAGER): Shared session manager, defaults to the one of the configuration.
+        """
+        self.file_name = files_name
+        self.config_file = config_file
+        self.env_variables_files = env_variables_files
+        self.source_path = source_path
+
+        self.session_manager = session_manager or SESSION_MANAGER.get(config_file, env_variables_files)
+        variables = self.session_manager.variables
 
         self.date_column_name = variables["variables"]["date_column_name"]
         self.staging_database_name = variables["variables"]["staging_database_name"]
@@ -53,6 +168,13 @@ class ELT:
         self.elt_md_table = variables["variables"]["elt_metadata"]
         self.login_types = variables["variables"]["login_types"]
 
+    @property
+    def session(self):
+        """
+        Snowflake session, opened on first use.
+        """
+        return self.session_manager.session
+
 
     def log_writter(self, step, status, message=None):
         """
@@ -280,33 +402,23 @@ class ELT:
         return "Uppercased columns success"
             
 
+#write_csv arguments left to the yaml values
+EXPORT_DEFAULT = object()
+
+
 #mdm builder
 class MDM_BUILDER:
-    def __init__(self, config_file, env_variables_files):
+    def __init__(self, config_file, env_variables_files, session_manager=None):
         """
         Initialize the MDM_BUILDER.
 
         Parameters:
         - config_file (str): Path to the configuration file.
         - env_variables_files (str): Path to the environment variables file.
+        - session_manager (SESSION_MANAGER): Shared session manager, defaults to the one of the configuration.
         """
-        with open(config_file, "r") as config:
-            credentials = yaml.safe_load(config)
-
-        connection_params = {
-            "account":credentials["snowflake"]["account"],
-            "user": credentials["snowflake"]["user"],
-            "password":credentials["snowflake"]["password"],
-            "role":credentials["snowflake"]["role"],
-            "warehouse":credentials["snowflake"]["warehouse"],
-            "database":credentials["snowflake"]["database"],
-            "schema": credentials["snowflake"]["schema"]
-        }
-
-        self.session = Session.builder.configs(connection_params).create()
-
-        with open(env_variables_files, "r") as config:
-            variables = yaml.safe_load(config)
+        self.session_manager = session_manager or SESSION_MANAGER.get(config_file, env_variables_files)
+        variables = self.session_manager.variables
 
         self.staging_database_name = variables["variables"]["staging_database_name"]
         self.cleaning_schema_name = variables["variables"]["cleaning_schema_name"]
@@ -332,6 +444,71 @@ class MDM_BUILDER:
         self.convert_string = variables["variables"]["convert_string"]
         self.convert_int = variables["variables"]["convert_int"]
         self.drop_columns_string = variables["variables"]["drop_columns"]
+        self.target_path = os.path.expanduser(variables["variables"]["target_path"])
+        self.export_format = variables["variables"]["export_format"]
+        self.export_compression = variables["variables"]["export_compression"]
+        self.export_max_file_bytes = variables["variables"]["export_max_file_bytes"]
+        self.export_state_file = variables["variables"]["export_state_file"]
+        self.user_daily_rollup_table_name = variables["variables"]["user_daily_rollup_table_name"]
+        self.currency_daily_rollup_table_name = variables["variables"]["currency_daily_rollup_table_name"]
+        self.bitmap_index_file = os.path.expanduser(variables["variables"]["bitmap_index_file"])
+        self.bitmap_index_values = None
+
+    @property
+    def session(self):
+        """
+        Snowflake session, opened on first use.
+        """
+        return self.session_manager.session
+
+    @property
+    def bitmap_index(self):
+        """
+        User bitmap index, loaded on first use and rebuilt from the warehouse when the index file is
+        missing, unreadable or was saved for a different number of fact table rows.
+        """
+        if self.bitmap_index_values is None:
+            self.bitmap_index_values = USER_BITMAP_INDEX(self.bitmap_index_file)
+            if not self.bitmap_index_values.loaded or self.bitmap_index_values.fact_rows != self.fact_rows():
+                self.bitmap_index_build()
+        return self.bitmap_index_values
+
+    def bitmap_index_build(self):
+        """
+        Build the user bitmap index from USERS_DIM and the whole user activities fact table.
+        """
+        self.log_writter(step="bitmap_index_build", status="start")
+        mdm = f"{self.mdm_database_name}.{self.mdm_schema_name}"
+        self.bitmap_index_values.clear()
+        self.bitmap_index_values.fact_rows = self.fact_rows()
+        if self.table_exists(self.target_users_table_name):
+            users_df = self.session.sql(f"SELECT {self.convert_string} FROM {mdm}.{self.target_users_table_name}").to_pandas()
+            self.bitmap_index_values.add_users(users_df[self.convert_string])
+        if self.table_exists(self.user_activities_table_name):
+            self.bitmap_index_update(self.bitmap_index_values, self.user_activities_table_name)
+        self.bitmap_index_values.save()
+        self.log_writter(step="bitmap_index_build", status="end")
+
+    def bitmap_index_update(self, bitmap_index, source_table):
+        """
+        Add the distinct (user, day, event name) rows of an activities table to the bitmap index.
+
+        Days come from activity_date, the same expression the rollups use.
+
+        Parameters:
+        - bitmap_index (USER_BITMAP_INDEX): Index to update.
+        - source_table (str): Name of the MDM activities table.
+
+        Returns:
+        - int: Number of skipped rows of users not in the index.
+        """
+        mdm = f"{self.mdm_database_name}.{self.mdm_schema_name}"
+        event_name_id = self.event_name_table_name.replace("_DIM", "_ID")
+        query = f"SELECT F.{self.convert_string}, {self.activity_date('F')} AS ACTIVITY_DATE, E.EVENT_NAME FROM {mdm}.{source_table} F JOIN {mdm}.{self.event_name_table_name} E ON E.ID = F.{event_name_id} GROUP BY 1, 2, 3"
+        skipped = 0
+        for batch in self.session.sql(query).to_pandas_batches():
+            skipped += bitmap_index.update(batch[self.convert_string], pd.to_datetime(batch["ACTIVITY_DATE"]), batch["EVENT_NAME"])
+        return skipped
 
     def log_writter(self, step, status, message=None):
         """
@@ -409,19 +586,242 @@ class MDM_BUILDER:
         self.log_writter(step="values_dict", status="end")
         return data_dict
     
-    def write_csv(self, table_name):
+    def table_exists(self, table_name):
+        """
+        Check if a MDM table exists.
+
+        Parameters:
+        - table_name (str): Name of the table.
+
+        Returns:
+        - bool: True if the table exists.
+        """
+        rows = self.session.sql(f"SELECT TABLE_NAME FROM {self.mdm_database_name}.INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = '{self.mdm_schema_name}' AND TABLE_NAME = '{table_name}'").collect()
+        return bool(rows)
+
+    def fact_rows(self):
+        """
+        Count the rows of the user activities fact table, the marker the bitmap index is saved with.
+
+        Returns:
+        - int: Number of rows, 0 if the table does not exist.
+        """
+        if not self.table_exists(self.user_activities_table_name):
+            return 0
+        rows = self.session.sql(f"SELECT COUNT(*) AS ROW_COUNT FROM {self.mdm_database_name}.{self.mdm_schema_name}.{self.user_activities_table_name}").collect()
+        return int(rows[0]['ROW_COUNT'])
+
+    def table_version(self, table_name):
+        """
+        Get the version marker of a MDM table.
+
+        Parameters:
+        - table_name (str): Name of the table.
+
+        Returns:
+        - str: LAST_ALTERED timestamp and ROW_COUNT of the table, None if the table is not found or has no LAST_ALTERED.
+        """
+        rows = self.session.sql(f"SELECT LAST_ALTERED, ROW_COUNT FROM {self.mdm_database_name}.INFORMATION_SCHEMA.TABLES WHERE TABLE_SCHEMA = '{self.mdm_schema_name}' AND TABLE_NAME = '{table_name}'").collect()
+        if not rows or rows[0]['LAST_ALTERED'] is None:
+            return None
+        return f"{rows[0]['LAST_ALTERED']}|{rows[0]['ROW_COUNT']}"
+
+    def export_state(self, table_name=None, export=None):
+        """
+        Read the export state file, optionally recording a new export.
+
+        Parameters:
+        - table_name (str): Name of the exported table to record.
+        - export (dict): version, file_format, compression, max_file_bytes and files of the export.
+
+        Returns:
+        - state (dict): Relation table_name, last export.
+        """
+        state_path = os.path.join(self.target_path, self.export_state_file)
+        state = {}
+        if os.path.exists(state_path):
+            with open(state_path, "r") as state_file:
+                state = yaml.safe_load(state_file) or {}
+        if table_name is not None:
+            state[table_name] = export
+            with open(state_path, "w") as state_file:
+                yaml.safe_dump(state, state_file)
+        return state
+
+    def export_up_to_date(self, table_name, export):
+        """
+        Check if the last export of a table matches a new one and its files still exist.
+
+        Parameters:
+        - table_name (str): Name of the table.
+        - export (dict): version, file_format, compression and max_file_bytes of the new export.
+
+        Returns:
+        - bool: True if the export can be skipped.
+        """
+        last_export = self.export_state().get(table_name)
+        if export["version"] is None or not isinstance(last_export, dict) or not last_export.get("files"):
+            return False
+        if any(last_export.get(key) != value for key, value in export.items()):
+            return False
+        return all(os.path.exists(os.path.join(self.target_path, file)) for file in last_export["files"])
+
+    def export_path(self, table_name, file_format, compression, part=None, directory=None):
+        """
+        Get the path of an export file.
+
+        Parameters:
+        - table_name (str): Name of the table.
+        - file_format (str): csv or parquet.
+        - compression (str): Compression codec, None for plain files.
+        - part (int): Part number, None for a single file export.
+        - directory (str): Directory of the file, defaults to target_path.
+
+        Returns:
+        - path (str): Path of the export file.
+        """
+        suffix = "" if part is None else f"_part_{part:04d}"
+        if file_format == "parquet":
+            extension = ".parquet"
+        else:
+            extension = ".csv" + {None: "", "gzip": ".gz", "bz2": ".bz2"}[compression]
+        return os.path.join(directory or self.target_path, f"{table_name}{suffix}{extension}")
+
+    def export_part_open(self, path, file_format, compression):
         """
-        Write DataFrame to CSV file.
+        Open an export part file.
+
+        Parameters:
+        - path (str): Path of the part file.
+        - file_format (str): csv or parquet.
+        - compression (str): Compression codec, None for plain files.
+
+        Returns:
+        - handle (file): Opened file handle, None for parquet (the writer is created with the first batch).
+        """
+        if file_format == "parquet":
+            return None
+        opener = {None: open, "gzip": gzip.open, "bz2": bz2.open}[compression]
+        return opener(path, "wt", newline="")
+
+    def export_batch(self, batch, path, handle, writer, compression, header):
+        """
+        Write a batch to the current export part.
+
+        Parquet batches are converted with the schema of the writer, fixed by the first batch, as
+        pandas may type a column differently from batch to batch (e.g. int64, then float64 with nulls).
+
+        Parameters:
+        - batch (DataFrame): Batch to write.
+        - path (str): Path of the part file.
+        - handle (file): CSV file handle, None for parquet.
+        - writer (ParquetWriter): Parquet writer of the part, None until the first batch.
+        - compression (str): Compression codec, None for plain files.
+        - header (bool): Write the CSV header.
+
+        Returns:
+        - writer (ParquetWriter): Parquet writer of the part, None for CSV.
+        """
+        if handle is None:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            if writer is None:
+                table = pa.Table.from_pandas(batch, preserve_index=False)
+                writer = pq.ParquetWriter(path, table.schema, compression=compression or "none")
+            else:
+                table = pa.Table.from_pandas(batch, schema=writer.schema, preserve_index=False)
+            writer.write_table(table)
+        else:
+            batch.to_csv(handle, index=False, header=header)
+            handle.flush()
+        return writer
+
+    def write_csv(self, table_name, file_format=EXPORT_DEFAULT, compression=EXPORT_DEFAULT, max_file_bytes=EXPORT_DEFAULT, force=False):
+        """
+        Stream a table to compressed CSV or Parquet files.
+
+        Result batches are fetched from Snowflake and written one at a time, so only a single
+        batch is held in memory. When max_file_bytes is set and a file reaches that size (checked
+        at batch boundaries), the export is split into <TABLE>_part_NNNN files. Files are written to
+        a staging directory and only replace the last export once the whole table is written. The
+        export is skipped when the table version and export settings match the last export and its files exist.
 
         Parameters:
         - table_name (str): Name of the table.
+        - file_format (str): csv or parquet, defaults to export_format in the yaml.
+        - compression (str): Compression codec, None or "none" for plain files, defaults to export_compression in the yaml.
+        - max_file_bytes (int): Size bound per part file, 0 to write a single file, defaults to export_max_file_bytes in the yaml.
+        - force (bool): Export even if the table has not changed.
 
         Returns:
         - str: Message indicating successful file creation.
         """
         self.log_writter(step="write_csv", status="start")
-        data = self.session.sql(f"SELECT * FROM {self.mdm_database_name}.{self.mdm_schema_name}.{table_name}").to_pandas()
-        output_file = data.to_csv(f'~/bitso_tech_challenge/challenge_2/target_files/{table_name}.csv')
+        file_format = self.export_format if file_format is EXPORT_DEFAULT else file_format
+        compression = self.export_compression if compression is EXPORT_DEFAULT else compression
+        compression = None if compression == "none" else compression
+        max_file_bytes = self.export_max_file_bytes if max_file_bytes is EXPORT_DEFAULT else max_file_bytes
+
+        export = {"version": self.table_version(table_name), "file_format": file_format, "compression": compression, "max_file_bytes": max_file_bytes}
+        if not force and self.export_up_to_date(table_name, export):
+            self.log_writter(step="write_csv", status="end")
+            return ("File up to date: " + table_name)
+
+        staging_path = os.path.join(self.target_path, f".{table_name}_export")
+        shutil.rmtree(staging_path, ignore_errors=True)
+        os.makedirs(staging_path)
+
+        table = f"{self.mdm_database_name}.{self.mdm_schema_name}.{table_name}"
+        part = None
+        path = self.export_path(table_name, file_format, compression, directory=staging_path)
+        files = [path]
+        handle = None
+        writer = None
+        written = False
+        try:
+            handle = self.export_part_open(path, file_format, compression)
+            part_batches = 0
+            for batch in self.session.table(table).to_pandas_batches():
+                if max_file_bytes and part_batches and os.path.getsize(path) >= max_file_bytes:
+                    if writer is not None:
+                        writer.close()
+                        writer = None
+                    if handle is not None:
+                        handle.close()
+                        handle = None
+                    if part is None:
+                        part = 0
+                        files = [self.export_path(table_name, file_format, compression, part, staging_path)]
+                        os.rename(path, files[0])
+                    part += 1
+                    path = self.export_path(table_name, file_format, compression, part, staging_path)
+                    files.append(path)
+                    handle = self.export_part_open(path, file_format, compression)
+                    part_batches = 0
+                writer = self.export_batch(batch, path, handle, writer, compression, header=part_batches == 0)
+                part_batches += 1
+            if part_batches == 0:
+                empty_df = self.session.sql(f"SELECT * FROM {table} LIMIT 0").to_pandas()
+                writer = self.export_batch(empty_df, path, handle, writer, compression, header=True)
+            written = True
+        finally:
+            if writer is not None:
+                writer.close()
+            if handle is not None:
+                handle.close()
+            if not written:
+                shutil.rmtree(staging_path, ignore_errors=True)
+
+        for pattern in [f"{table_name}.csv*", f"{table_name}.parquet", f"{table_name}_part_*"]:
+            for stale_file in glob.glob(os.path.join(self.target_path, pattern)):
+                os.remove(stale_file)
+        for file in files:
+            os.replace(file, os.path.join(self.target_path, os.path.basename(file)))
+        os.rmdir(staging_path)
+
+        export["files"] = [os.path.basename(file) for file in files]
+        self.export_state(table_name, export)
         self.log_writter(step="write_csv", status="end")
         return ("Successfull file creation: " + table_name)
     
@@ -522,7 +922,7 @@ class MDM_BUILDER:
         deposit_event_name = clean_deposit_df[['EVENT_NAME']].drop_duplicates()
         withdrawal_event_name = clean_withdrawal_df[['EVENT_NAME']].drop_duplicates()
         
-        event_name_df = pd.concat([event_event_name, deposit_event_name, withdrawal_event_name]).drop_duplicates(keep=False)
+        event_name_df = pd.concat([event_event_name, deposit_event_name, withdrawal_event_name]).drop_duplicates()
         
 
         print(event_name_df)
@@ -560,7 +960,7 @@ class MDM_BUILDER:
         deposit_currency = clean_deposit_df[['CURRENCY']].drop_duplicates()
         withdrawal_currency = clean_withdrawal_df[['CURRENCY']].drop_duplicates()
 
-        currency_df = pd.concat([deposit_currency, withdrawal_currency]).drop_duplicates(keep=False)
+        currency_df = pd.concat([deposit_currency, withdrawal_currency]).drop_duplicates()
 
         create_event_table = self.table_dim_builder(currency_df, self.currency_table_name)
         dim_csv = self.write_csv(self.currency_table_name)
@@ -591,7 +991,7 @@ class MDM_BUILDER:
         deposit_event_name = clean_deposit_df[['TX_STATUS']].drop_duplicates()
         withdrawal_event_name = clean_withdrawal_df[['TX_STATUS']].drop_duplicates()
 
-        tx_status_df = pd.concat([deposit_event_name, withdrawal_event_name]).drop_duplicates(keep=False)
+        tx_status_df = pd.concat([deposit_event_name, withdrawal_event_name]).drop_duplicates()
 
         create_tx_table = self.table_dim_builder(tx_status_df, self.tx_table_name)
         dim_csv = self.write_csv(self.event_name_table_name)
@@ -606,6 +1006,8 @@ class MDM_BUILDER:
         clean_users_df = self.table_retriever(self.staging_database_name, self.cleaning_schema_name, self.source_users_table_name)
         
         create_users_table = self.table_dim_builder(clean_users_df, self.target_users_table_name)
+        self.bitmap_index.add_users(clean_users_df[self.convert_string])
+        self.bitmap_index.save()
         event_dim_csv = self.write_csv(self.target_users_table_name)
         self.log_writter(step="users_process", status="end")
         return f"{self.login_type_table_name} table successfully created"
@@ -655,13 +1057,142 @@ class MDM_BUILDER:
         concat_df.replace(0, np.nan, inplace=True)
         concat_df = concat_df.drop(columns=self.drop_columns_string)
 
+        #load and check the bitmap index against the fact table before the batch is added to it
+        bitmap_index = self.bitmap_index
         write_fact = self.table_fact_builder(concat_df, self.user_activities_table_name)
+        batch_table = f"{self.user_activities_table_name}_BATCH"
+        write_batch = self.session.write_pandas(concat_df, batch_table, database = self.mdm_database_name, schema = self.mdm_schema_name, auto_create_table = True, overwrite = True, table_type = "temporary", use_logical_type = True)
+        try:
+            rollups = self.rollup_process(batch_table)
+            bitmaps = self.bitmap_index_process(batch_table)
+        finally:
+            self.session.sql(f"DROP TABLE IF EXISTS {self.mdm_database_name}.{self.mdm_schema_name}.{batch_table}").collect()
         write_csv = self.write_csv(self.user_activities_table_name)
         self.log_writter(step="users_process", status="end")
         self.log_writter(step="user_activities_process", status="end")
         return f"{self.login_type_table_name} table successfully created" 
 
 
+    def activity_date(self, table_alias=None):
+        """
+        Get the SQL expression of the day of an activity.
+
+        Rollups and the bitmap index bucket activities by this expression only, so the build from
+        the fact table and the later batches always agree on the day.
+
+        Parameters:
+        - table_alias (str): Alias of the activities table in the query.
+
+        Returns:
+        - str: SQL expression.
+        """
+        column = f"{table_alias}.{self.convert_timestamp}" if table_alias else self.convert_timestamp
+        return f"DATE({column})"
+
+    def rollup_select(self, source_table, select_clause, group_by, where_clause=None):
+        """
+        Get the query aggregating an activities table into rollup rows.
+
+        Parameters:
+        - source_table (str): Name of the MDM activities table.
+        - select_clause (str): Keys and aggregations of the rollup.
+        - group_by (str): Group by columns.
+        - where_clause (str): Filter conditions.
+
+        Returns:
+        - query (str): SQL query.
+        """
+        query = f"SELECT {select_clause} FROM {self.mdm_database_name}.{self.mdm_schema_name}.{source_table}"
+        if where_clause:
+            query += f" WHERE {where_clause}"
+        query += f" GROUP BY {group_by}"
+        return query
+
+    def rollup_merge(self, table_name, source_query, key_columns, sum_columns, max_columns=None):
+        """
+        Merge an aggregated batch into a rollup table.
+
+        Matching keys add up the sum columns and keep the greatest value of the max columns,
+        new keys are inserted.
+
+        Parameters:
+        - table_name (str): Name of the rollup table.
+        - source_query (str): Query returning the aggregated batch.
+        - key_columns (list): Columns identifying a rollup row.
+        - sum_columns (list): Additive columns.
+        - max_columns (list): Columns keeping their maximum value.
+        """
+        self.log_writter(step="rollup_merge", status="start")
+        max_columns = max_columns or []
+        target = f"{self.mdm_database_name}.{self.mdm_schema_name}.{table_name}"
+        on_clause = " AND ".join([f"T.{c} = D.{c}" for c in key_columns])
+        update_clause = ", ".join([f"{c} = T.{c} + D.{c}" for c in sum_columns] + [f"{c} = GREATEST(T.{c}, D.{c})" for c in max_columns])
+        columns = key_columns + sum_columns + max_columns
+        insert_columns = ", ".join(columns)
+        insert_values = ", ".join([f"D.{c}" for c in columns])
+        self.session.sql(f"MERGE INTO {target} T USING ({source_query}) D ON {on_clause} WHEN MATCHED THEN UPDATE SET {update_clause} WHEN NOT MATCHED THEN INSERT ({insert_columns}) VALUES ({insert_values})").collect()
+        self.log_writter(step="rollup_merge", status="end")
+
+    def rollup_build(self, table_name, select_clause, group_by, where_clause=None):
+        """
+        Build a rollup table from the whole user activities fact table.
+
+        Parameters:
+        - table_name (str): Name of the rollup table.
+        - select_clause (str): Keys and aggregations of the rollup.
+        - group_by (str): Group by columns.
+        - where_clause (str): Filter conditions.
+        """
+        self.log_writter(step="rollup_build", status="start")
+        query = self.rollup_select(self.user_activities_table_name, select_clause, group_by, where_clause)
+        self.session.sql(f"CREATE TABLE {self.mdm_database_name}.{self.mdm_schema_name}.{table_name} AS {query}").collect()
+        self.log_writter(step="rollup_build", status="end")
+
+    def rollup_process(self, batch_table):
+        """
+        Update the daily rollup tables with a new user activities batch.
+
+        Must run after the batch is written to the fact table: a missing rollup is built once from
+        the whole fact table, batch included, and later batches are aggregated with the same query
+        and merged into it.
+
+        Parameters:
+        - batch_table (str): Name of the MDM table holding the batch written to the fact table.
+        """
+        self.log_writter(step="rollup_process", status="start")
+        event_name_id = self.event_name_table_name.replace("_DIM", "_ID")
+        currency_id = self.currency_table_name.replace("_DIM", "_ID")
+        user_id = self.convert_string
+        timestamp = self.convert_timestamp
+        rollups = [
+            (self.user_daily_rollup_table_name, [user_id], ["LAST_EVENT_TIMESTAMP"], None,
+             f"{self.activity_date()} AS ACTIVITY_DATE, {user_id}, {event_name_id}, COUNT(*) AS EVENT_COUNT, COALESCE(SUM(AMOUNT), 0) AS AMOUNT_SUM, MAX({timestamp}) AS LAST_EVENT_TIMESTAMP"),
+            (self.currency_daily_rollup_table_name, [currency_id], [], f"{currency_id} IS NOT NULL",
+             f"{self.activity_date()} AS ACTIVITY_DATE, {currency_id}, {event_name_id}, COUNT(*) AS EVENT_COUNT, COALESCE(SUM(AMOUNT), 0) AS AMOUNT_SUM"),
+        ]
+        for table_name, key_columns, max_columns, where_clause, select_clause in rollups:
+            if not self.table_exists(table_name):
+                self.rollup_build(table_name, select_clause, "1, 2, 3", where_clause)
+            else:
+                source_query = self.rollup_select(batch_table, select_clause, "1, 2, 3", where_clause)
+                self.rollup_merge(table_name, source_query, ["ACTIVITY_DATE"] + key_columns + [event_name_id], ["EVENT_COUNT", "AMOUNT_SUM"], max_columns)
+        self.log_writter(step="rollup_process", status="end")
+
+    def bitmap_index_process(self, batch_table):
+        """
+        Update the user bitmap index with a new user activities batch.
+
+        Parameters:
+        - batch_table (str): Name of the MDM table holding the batch written to the fact table.
+        """
+        self.log_writter(step="bitmap_index_process", status="start")
+        skipped = self.bitmap_index_update(self.bitmap_index, batch_table)
+        self.bitmap_index.fact_rows = self.fact_rows()
+        self.bitmap_index.save()
+        if skipped:
+            print(f"Activities of users not in {self.target_users_table_name} skipped: {skipped}")
+        self.log_writter(step="bitmap_index_process", status="end")
+
     def mdm_process_start(self):
         """
         Start MDM transformation process.
@@ -676,16 +1207,353 @@ class MDM_BUILDER:
         self.log_writter(step="mdm_process_start", status="end")
 
 
+#user bitmap index
+class USER_BITMAP_INDEX:
+    def __init__(self, index_file):
+        """
+        Initialize the USER_BITMAP_INDEX.
 
+        Every user gets a dense integer id and the users active on a (day, event name) pair are
+        stored as a compressed roaring bitmap, so distinct-user and set questions are answered
+        in memory with union, intersection and difference. The index file is loaded when it exists,
+        loaded tells if it could be read.
 
+        Parameters:
+        - index_file (str): Path to the local index file.
+        """
+        self.index_file = index_file
+        self.clear()
+        self.loaded = self.load()
 
-config_file = 'config.yaml'
-env_variables_files = 'variables.yaml'
-source_path = '~/bitso_tech_challenge/challenge_2/source_files/'
-files = os.listdir(os.path.expanduser(source_path))
+    def clear(self):
+        """
+        Empty the index.
+        """
+        self.users = []
+        self.user_ids = {}
+        self.bitmaps = {}
+        self.fact_rows = None
 
-start_elt = ELT(files, config_file, env_variables_files, source_path)
-start_elt.start_etl_process()
+    def load(self):
+        """
+        Load the local index file.
+
+        Returns:
+        - bool: True if the file exists and could be read.
+        """
+        from pyroaring import BitMap
+
+        if not os.path.exists(self.index_file):
+            return False
+        try:
+            with open(self.index_file, "rb") as index:
+                data = pickle.load(index)
+            bitmaps = {key: BitMap.deserialize(value) for key, value in data["bitmaps"].items()}
+            users = data["users"]
+            fact_rows = data.get("fact_rows")
+        except Exception as e:
+            print(f"Bitmap index file {self.index_file} could not be read: {e}")
+            return False
+        self.users = users
+        self.user_ids = {user: i for i, user in enumerate(self.users)}
+        self.bitmaps = bitmaps
+        self.fact_rows = fact_rows
+        return True
+
+    def save(self):
+        """
+        Persist the index to the local index file.
+
+        The index is written to a temporary file that then replaces the index file, so a failed
+        save never leaves a truncated index behind.
+        """
+        os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+        data = {"users": self.users, "fact_rows": self.fact_rows, "bitmaps": {key: bitmap.serialize() for key, bitmap in self.bitmaps.items()}}
+        temp_file = f"{self.index_file}.tmp"
+        with open(temp_file, "wb") as index:
+            pickle.dump(data, index)
+        os.replace(temp_file, self.index_file)
+
+    def add_users(self, users):
+        """
+        Assign dense integer ids to new USERS_DIM users.
+
+        Parameters:
+        - users (iterable): User ids.
+        """
+        users = pd.Series(users, dtype=str)
+        new_users = pd.unique(users[~users.isin(self.user_ids)])
+        for user in new_users:
+            self.user_ids[user] = len(self.users)
+            self.users.append(user)
+
+    def update(self, users, days, event_names):
+        """
+        Add a batch of activities to the index.
+
+        Only users already added with add_users are indexed, activities of unknown users are skipped.
+
+        Parameters:
+        - users (iterable): User id of every activity.
+        - days (iterable): Day of every activity, as YYYY-MM-DD strings or day timestamps.
+        - event_names (iterable): Event name of every activity.
+
+        Returns:
+        - int: Number of skipped activities.
+        """
+        from pyroaring import BitMap
+
+        day_codes, day_values = pd.factorize(pd.Series(days))
+        if isinstance(day_values, pd.DatetimeIndex):
+            day_values = day_values.strftime("%Y-%m-%d")
+        event_codes, event_values = pd.factorize(np.asarray(event_names))
+        df = pd.DataFrame({"ID": pd.Index(self.users).get_indexer(pd.Series(users, dtype=str)), "DAY": day_codes, "EVENT_NAME": event_codes})
+        known_df = df[df["ID"] >= 0]
+        for (day_code, event_code), ids in known_df.groupby(["DAY", "EVENT_NAME"])["ID"]:
+            key = (str(day_values[day_code]), str(event_values[event_code]))
+            bitmap = BitMap(ids.to_numpy(dtype="uint32"))
+            if key in self.bitmaps:
+                self.bitmaps[key] |= bitmap
+            else:
+                self.bitmaps[key] = bitmap
+        return len(df) - len(known_df)
+
+    def active(self, event_names, start_day=None, end_day=None):
+        """
+        Get the users with any of the given events between two days.
+
+        Parameters:
+        - event_names (list): Event names.
+        - start_day (str): Start date in YYYY-MM-DD format, None for no lower bound.
+        - end_day (str): End date in YYYY-MM-DD format, None for no upper bound.
+
+        Returns:
+        - BitMap: Dense ids of the matching users.
+        """
+        from pyroaring import BitMap
+
+        bitmaps = [bitmap for (day, event_name), bitmap in self.bitmaps.items()
+                   if event_name in event_names and (start_day is None or day >= start_day) and (end_day is None or day <= end_day)]
+        return BitMap.union(*bitmaps) if bitmaps else BitMap()
 
-start_mdm = MDM_BUILDER(config_file, env_variables_files)
-start_mdm.mdm_process_start()
+    def all_users(self):
+        """
+        Get every user in the index.
+
+        Returns:
+        - BitMap: Dense ids of all the users.
+        """
+        from pyroaring import BitMap
+
+        return BitMap(range(len(self.users)))
+
+    def user_names(self, bitmap):
+        """
+        Translate dense ids back to user ids.
+
+        Parameters:
+        - bitmap (BitMap): Dense ids.
+
+        Returns:
+        - list: User ids.
+        """
+        return [self.users[i] for i in bitmap]
+
+    def active_users(self, day):
+        """
+        Count users that made a deposit or withdrawal on a given day.
+
+        Parameters:
+        - day (str): Date in YYYY-MM-DD format.
+
+        Returns:
+        - int: Number of active users.
+        """
+        return len(self.active(["deposit", "withdrawal"], day, day))
+
+    def users_without(self, event_name):
+        """
+        Get users that never had a given event.
+
+        Parameters:
+        - event_name (str): Event name, e.g. deposit.
+
+        Returns:
+        - list: User ids.
+        """
+        return self.user_names(self.all_users() - self.active([event_name]))
+
+
+#rollup queries
+class ROLLUP_QUERIES:
+    def __init__(self, config_file, env_variables_files, session_manager=None):
+        """
+        Initialize the ROLLUP_QUERIES.
+
+        Parameters:
+        - config_file (str): Path to the configuration file.
+        - env_variables_files (str): Path to the environment variables file.
+        - session_manager (SESSION_MANAGER): Shared session manager, defaults to the one of the configuration.
+        """
+        self.session_manager = session_manager or SESSION_MANAGER.get(config_file, env_variables_files)
+        variables = self.session_manager.variables
+
+        self.mdm_database_name = variables["variables"]["mdm_database_name"]
+        self.mdm_schema_name = variables["variables"]["mdm_schema_name"]
+        self.event_name_table_name = variables["variables"]["event_name_table_name"]
+        self.currency_table_name = variables["variables"]["currency_table_name"]
+        self.user_daily_rollup_table_name = variables["variables"]["user_daily_rollup_table_name"]
+        self.currency_daily_rollup_table_name = variables["variables"]["currency_daily_rollup_table_name"]
+
+    @property
+    def session(self):
+        """
+        Snowflake session, opened on first use.
+        """
+        return self.session_manager.session
+
+    def rollup_query(self, table_name, select_clause, where_clause, group_by=None, having=None, order_by=None):
+        """
+        Query a rollup table joined to the event name dimension.
+
+        Parameters:
+        - table_name (str): Name of the rollup table.
+        - select_clause (str): Columns to select.
+        - where_clause (str): Filter conditions.
+        - group_by (str): Group by columns.
+        - having (str): Having conditions.
+        - order_by (str): Order by columns.
+
+        Returns:
+        - df (DataFrame): Query result.
+        """
+        query = f"SELECT {select_clause} FROM {self.mdm_database_name}.{self.mdm_schema_name}.{table_name} R JOIN {self.mdm_database_name}.{self.mdm_schema_name}.{self.event_name_table_name} E ON E.ID = R.EVENT_NAME_ID"
+        if table_name == self.currency_daily_rollup_table_name:
+            query += f" JOIN {self.mdm_database_name}.{self.mdm_schema_name}.{self.currency_table_name} C ON C.ID = R.CURRENCY_ID"
+        query += f" WHERE {where_clause}"
+        if group_by:
+            query += f" GROUP BY {group_by}"
+        if having:
+            query += f" HAVING {having}"
+        if order_by:
+            query += f" ORDER BY {order_by}"
+        return self.session.sql(query).to_pandas()
+
+    def active_users(self, day):
+        """
+        Count users that made a deposit or withdrawal on a given day.
+
+        Parameters:
+        - day (str): Date in YYYY-MM-DD format.
+
+        Returns:
+        - int: Number of active users.
+        """
+        df = self.rollup_query(self.user_daily_rollup_table_name, "COUNT(DISTINCT R.USER_ID) ACTIVE_USERS", f"E.EVENT_NAME IN ('deposit', 'withdrawal') AND R.ACTIVITY_DATE = '{day}'")
+        return int(df['ACTIVE_USERS'][0])
+
+    def users_with_deposits(self, day, min_deposits=5):
+        """
+        Get users that made more than min_deposits deposits up to a given day.
+
+        Parameters:
+        - day (str): Date in YYYY-MM-DD format.
+        - min_deposits (int): Deposits threshold.
+
+        Returns:
+        - df (DataFrame): USER_ID and DEPOSITS.
+        """
+        return self.rollup_query(self.user_daily_rollup_table_name, "R.USER_ID, SUM(R.EVENT_COUNT) DEPOSITS", f"E.EVENT_NAME = 'deposit' AND R.ACTIVITY_DATE <= '{day}'", group_by="1", having=f"SUM(R.EVENT_COUNT) > {min_deposits}", order_by="2 DESC")
+
+    def last_login(self):
+        """
+        Get the last login of every user.
+
+        Returns:
+        - df (DataFrame): USER_ID and LAST_LOGIN.
+        """
+        return self.rollup_query(self.user_daily_rollup_table_name, "R.USER_ID, MAX(R.LAST_EVENT_TIMESTAMP) LAST_LOGIN", "E.EVENT_NAME = 'login'", group_by="1", order_by="2 DESC")
+
+    def logins_between(self, start_day, end_day):
+        """
+        Count the logins of every user between two dates.
+
+        Parameters:
+        - start_day (str): Start date in YYYY-MM-DD format.
+        - end_day (str): End date in YYYY-MM-DD format.
+
+        Returns:
+        - df (DataFrame): USER_ID and LOGINS.
+        """
+        return self.rollup_query(self.user_daily_rollup_table_name, "R.USER_ID, SUM(R.EVENT_COUNT) LOGINS", f"E.EVENT_NAME = 'login' AND R.ACTIVITY_DATE BETWEEN '{start_day}' AND '{end_day}'", group_by="1", order_by="2 DESC")
+
+    def currencies(self, day, event_name):
+        """
+        Get the currencies used by an event on a given day.
+
+        Parameters:
+        - day (str): Date in YYYY-MM-DD format.
+        - event_name (str): deposit or withdrawal.
+
+        Returns:
+        - df (DataFrame): CURRENCY_NAME.
+        """
+        return self.rollup_query(self.currency_daily_rollup_table_name, "C.CURRENCY_NAME", f"E.EVENT_NAME = '{event_name}' AND R.ACTIVITY_DATE = '{day}'", group_by="1")
+
+    def currency_amounts(self, day, event_name="deposit"):
+        """
+        Get the total amount of every currency for an event on a given day.
+
+        Parameters:
+        - day (str): Date in YYYY-MM-DD format.
+        - event_name (str): deposit or withdrawal.
+
+        Returns:
+        - df (DataFrame): CURRENCY_NAME and AMOUNT.
+        """
+        return self.rollup_query(self.currency_daily_rollup_table_name, "C.CURRENCY_NAME, SUM(R.AMOUNT_SUM) AMOUNT", f"E.EVENT_NAME = '{event_name}' AND R.ACTIVITY_DATE = '{day}'", group_by="1", order_by="2 DESC")
+
+
+
+
+
+def run_pipelines(stages, config_file, env_variables_files, source_path, session_manager=None):
+    """
+    Run the ELT and/or MDM pipelines sharing one Snowflake session.
+
+    Parameters:
+    - stages (list): Pipelines to run, elt and/or mdm.
+    - config_file (str): Path to the configuration file.
+    - env_variables_files (str): Path to the environment variables file.
+    - source_path (str): Path to the source directory containing input files.
+    - session_manager (SESSION_MANAGER): Shared session manager, left open. When None a private manager is
+      created and closed once the pipelines end, so managers shared through SESSION_MANAGER.get are never closed.
+    """
+    close_manager = session_manager is None
+    if close_manager:
+        session_manager = SESSION_MANAGER(config_file, env_variables_files)
+    try:
+        if "elt" in stages:
+            files = os.listdir(os.path.expanduser(source_path))
+            start_elt = ELT(files, config_file, env_variables_files, source_path, session_manager)
+            start_elt.start_etl_process()
+        if "mdm" in stages:
+            start_mdm = MDM_BUILDER(config_file, env_variables_files, session_manager)
+            start_mdm.mdm_process_start()
+    finally:
+        if close_manager:
+            session_manager.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the ELT and MDM pipelines.")
+    parser.add_argument("stage", nargs="?", choices=["elt", "mdm", "all"], default="all")
+    parser.add_argument("--config-file", default="config.yaml")
+    parser.add_argument("--env-variables-files", default="variables.yaml")
+    parser.add_argument("--source-path", default="~/bitso_tech_challenge/challenge_2/source_files/")
+    args = parser.parse_args()
+
+    stages = ["elt", "mdm"] if args.stage == "all" else [args.stage]
+    run_pipelines(stages, args.config_file, args.env_variables_files, args.source_path)
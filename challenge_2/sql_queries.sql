@@ -68,4 +68,45 @@ JOIN MDM_DEV.MDM_SCHEMA.EVENT_NAME_DIM E ON E.ID = UAF.EVENT_NAME_ID
 JOIN MDM_DEV.MDM_SCHEMA.CURRENCY_DIM C ON C.ID = UAF.CURRENCY_ID
 WHERE DATE(EVENT_TIMESTAMP) = '2020-10-12' AND EVENT_NAME = 'deposit'
 GROUP BY 1
-ORDER BY 2 DESC;
\ No newline at end of file
+ORDER BY 2 DESC;
+
+--Rollup based versions, maintained incrementally by MDM_BUILDER.rollup_process
+
+--How many users were active on a given day (they made a deposit or withdrawal)
+SELECT COUNT(DISTINCT USER_ID)
+FROM MDM_DEV.MDM_SCHEMA.USER_DAILY_ROLLUP R
+JOIN MDM_DEV.MDM_SCHEMA.EVENT_NAME_DIM E ON E.ID = R.EVENT_NAME_ID
+WHERE EVENT_NAME IN ('deposit', 'withdrawal') AND ACTIVITY_DATE = '2020-02-10';
+
+--Identify on a given day which users have made more than 5 deposits historically
+SELECT USER_ID, SUM(EVENT_COUNT) DEPOSITS
+FROM MDM_DEV.MDM_SCHEMA.USER_DAILY_ROLLUP R
+JOIN MDM_DEV.MDM_SCHEMA.EVENT_NAME_DIM E ON E.ID = R.EVENT_NAME_ID
+WHERE EVENT_NAME = 'deposit' AND ACTIVITY_DATE <= '2021-10-12'
+GROUP BY 1 HAVING SUM(EVENT_COUNT) > 5
+ORDER BY 2 DESC;
+
+--When was the last time a user made a login
+SELECT USER_ID, MAX(LAST_EVENT_TIMESTAMP) LAST_LOGIN
+FROM MDM_DEV.MDM_SCHEMA.USER_DAILY_ROLLUP R
+JOIN MDM_DEV.MDM_SCHEMA.EVENT_NAME_DIM E ON E.ID = R.EVENT_NAME_ID
+WHERE EVENT_NAME = 'login'
+GROUP BY 1
+ORDER BY 2 DESC;
+
+--How many times a user has made a login between two dates
+SELECT USER_ID, SUM(EVENT_COUNT) LOGINS
+FROM MDM_DEV.MDM_SCHEMA.USER_DAILY_ROLLUP R
+JOIN MDM_DEV.MDM_SCHEMA.EVENT_NAME_DIM E ON E.ID = R.EVENT_NAME_ID
+WHERE EVENT_NAME = 'login' AND ACTIVITY_DATE BETWEEN '2020-01-01' AND '2020-12-31'
+GROUP BY 1
+ORDER BY 2 DESC;
+
+--Total amount deposited of a given currency on a given day
+SELECT CURRENCY_NAME, SUM(AMOUNT_SUM)
+FROM MDM_DEV.MDM_SCHEMA.CURRENCY_DAILY_ROLLUP R
+JOIN MDM_DEV.MDM_SCHEMA.EVENT_NAME_DIM E ON E.ID = R.EVENT_NAME_ID
+JOIN MDM_DEV.MDM_SCHEMA.CURRENCY_DIM C ON C.ID = R.CURRENCY_ID
+WHERE ACTIVITY_DATE = '2020-10-12' AND EVENT_NAME = 'deposit'
+GROUP BY 1
+ORDER BY 2 DESC;